@@ -0,0 +1,10 @@
+import asyncpg
+from fastapi import Request
+
+async def get_pool(request: Request) -> asyncpg.Pool:
+    """
+    Dependency returning the PostgreSQL connection pool.
+    The pool is created on app.state at startup, and startup fails if it cannot be created,
+    so endpoints never see an uninitialized pool.
+    """
+    return request.app.state.db_pool
@@ -1,22 +1,24 @@
 import os
 import asyncio
+import logging
+import socket
+import time
 import asyncpg
-import psutil
 from fastapi import FastAPI, HTTPException, Request
-from starlette.responses import PlainTextResponse
+from starlette.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from secure import SecureHeaders
-from prometheus_client import generate_latest, REGISTRY
+from prometheus_client import generate_latest
 
 # Import your modules
 from app.config import settings
-from app.metrics.system_metrics import update_system_metrics
+from app.metrics.app_metrics import items_in_db_gauge
+from app.metrics.system_metrics import APP_REGISTRY
+from app.middleware.logging_middleware import LoggingMiddleware, log_listener
 from app.middleware.metrics_middleware import MetricsMiddleware
+from app.middleware.secure_headers_middleware import SecureHeadersMiddleware
 from app.routers import api, health
 
-secure_headers = SecureHeaders()
-
 # FastAPI app
 app = FastAPI(
     title="FastAPI PostgreSQL App",
@@ -36,31 +38,37 @@ app.add_middleware(
 )
 
 # Middleware: Logging requests
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    print(f"Request: {request.method} {request.url}")
-    response = await call_next(request)
-    print(f"Response status: {response.status_code}")
-    return response
+app.add_middleware(LoggingMiddleware)
 
 # Middleware: Secure headers (like Helmet)
-@app.middleware("http")
-async def secure_headers_middleware(request: Request, call_next):
-    response = await call_next(request)
-    secure_headers.starlette(response)
-    return response
+app.add_middleware(SecureHeadersMiddleware)
 
 # Custom Metrics Middleware (must be after other middlewares to capture their processing time if desired)
 app.add_middleware(MetricsMiddleware)
 
+# Middleware: On-demand profiling with ?profile=1 (outermost so the whole stack is profiled)
+if settings.PROFILING:
+    from app.middleware.profiler_middleware import ProfilerMiddleware
+    app.add_middleware(ProfilerMiddleware)
+
+logger = logging.getLogger(__name__)
+
 # Database connection pool variable
 db_pool = None
 
-# Background task for updating system metrics
-async def update_system_metrics_task():
+# Encoded /metrics payload as (monotonic timestamp, bytes), reused for _METRICS_TTL seconds
+# so scrapes arriving together (e.g. HA Prometheus replicas) share one encoding
+_METRICS_CACHE = (0.0, b"")
+_METRICS_TTL = 1.0
+
+# Background task correcting drift in the items gauge (kept live by inc()/dec() in the api router)
+async def reconcile_items_gauge_task():
     while True:
-        update_system_metrics()
-        await asyncio.sleep(15) # Update every 15 seconds
+        await asyncio.sleep(60) # Reconcile every 60 seconds
+        try:
+            items_in_db_gauge.set(await db_pool.fetchval("SELECT COUNT(*) FROM items"))
+        except Exception:
+            logger.exception("Error reconciling items gauge")
 
 @app.on_event("startup")
 async def startup_event():
@@ -69,20 +77,27 @@ async def startup_event():
     It initializes the PostgreSQL connection pool and starts background tasks.
     """
     global db_pool
+
+    # Start writing queued request logs to stdout
+    log_listener.start()
+
     try:
         # Create the connection pool
         db_pool = await asyncpg.create_pool(
             settings.DATABASE_URL,
-            min_size=1,
-            max_size=10,
+            min_size=min(settings.POOL_MIN, settings.POOL_MAX), # warm connections kept open for bursts (never above max_size)
+            max_size=settings.POOL_MAX,
+            max_inactive_connection_lifetime=300, # seconds before idle connections above min_size are closed
+            statement_cache_size=2048, # prepared statements cached per connection
+            max_cached_statement_lifetime=0, # never expire cached statements
             timeout=30, # seconds to wait for a connection from the pool
-            command_timeout=30 # seconds to wait for a command to execute
+            command_timeout=5, # seconds to wait for a command to execute
+            server_settings={'jit': 'off'} # JIT compilation only adds startup cost to these trivial queries
         )
         print(f"Successfully connected to PostgreSQL at {settings.DATABASE_URL}")
 
-        # Pass the db_pool to routers that need it
-        api.db_pool = db_pool
-        health.db_pool = db_pool
+        # Expose the pool to routers through the get_pool dependency
+        app.state.db_pool = db_pool
 
         # Create a table if it doesn't exist and update gauge on startup
         async with db_pool.acquire() as connection:
@@ -96,10 +111,17 @@ async def startup_event():
 
             # Initial count for items_in_db_gauge
             count = await connection.fetchval("SELECT COUNT(*) FROM items")
-            api.items_in_db_gauge.set(count)
+            items_in_db_gauge.set(count)
+
+        # Start background task batching item inserts
+        api.insert_queue = asyncio.Queue()
+        asyncio.create_task(api.batch_insert_writer(db_pool))
+
+        # Start background task reconciling the items gauge with the table
+        asyncio.create_task(reconcile_items_gauge_task())
 
-        # Start background task for system metrics
-        asyncio.create_task(update_system_metrics_task())
+        # Start background task probing database health for /health
+        asyncio.create_task(health.db_health_probe_task(db_pool))
 
     except Exception as e:
         print(f"Failed to connect to PostgreSQL or create table: {e}")
@@ -117,6 +139,20 @@ async def shutdown_event():
         await db_pool.close()
         print("PostgreSQL connection pool closed.")
 
+    # Flush any remaining request logs
+    log_listener.stop()
+
+# Database errors raised by any endpoint (the routers no longer wrap each query in try/except).
+# The client gets a static message; the exception itself is only logged.
+@app.exception_handler(asyncpg.PostgresError)
+@app.exception_handler(asyncpg.InterfaceError) # e.g. closed connection or closing pool
+@app.exception_handler(asyncio.TimeoutError) # command_timeout exceeded
+@app.exception_handler(ConnectionError) # connection refused/reset talking to Postgres
+@app.exception_handler(socket.gaierror) # database host name does not resolve
+async def database_exception_handler(request: Request, exc: Exception):
+    logger.error("Database error on %s %s", request.method, request.url.path, exc_info=exc)
+    return JSONResponse(status_code=500, content={"detail": "Database error."})
+
 # Include routers
 app.include_router(api.router)
 app.include_router(health.router)
@@ -133,7 +169,17 @@ async def metrics():
     """
     Endpoint to expose Prometheus metrics.
     """
-    # This ensures the CPU utilization is updated just before metrics are exposed
-    # For a more consistent view, the background task is better, but this provides fresh data on scrape.
-    # update_system_metrics() # Called by background task now.
-    return PlainTextResponse(generate_latest())
\ No newline at end of file
+    # System metrics are read by SystemCollector during generate_latest(); none of them block.
+    global _METRICS_CACHE
+    now = time.monotonic()
+    cached_at, payload = _METRICS_CACHE
+    if now - cached_at > _METRICS_TTL:
+        # Only APP_REGISTRY is exposed: every application metric is registered there
+        payload = generate_latest(APP_REGISTRY)
+        _METRICS_CACHE = (now, payload)
+    return PlainTextResponse(payload)
+
+if __name__ == "__main__":
+    # Programmatic run (python -m app.main) with the same event loop/HTTP parser as the Dockerfile
+    import uvicorn
+    uvicorn.run("app.main:app", host=settings.APP_HOST, port=settings.APP_PORT, loop="uvloop", http="httptools")
@@ -0,0 +1,16 @@
+from prometheus_client import Counter, Gauge
+
+# Import the custom registry from system_metrics
+from app.metrics.system_metrics import APP_REGISTRY
+
+# Application (items) metrics, registered with APP_REGISTRY
+items_created_counter = Counter(
+    'items_created_total',
+    'Total number of items created.',
+    registry=APP_REGISTRY # Register with the custom registry
+)
+items_in_db_gauge = Gauge(
+    'items_in_database',
+    'Current number of items stored in the database.',
+    registry=APP_REGISTRY # Register with the custom registry
+)
@@ -1,31 +1,44 @@
-from prometheus_client import Counter, Histogram
+from prometheus_client import Histogram
+from prometheus_client.core import CounterMetricFamily
 
-# Counter for total HTTP requests
-http_requests_total = Counter(
-    'http_requests_total',
-    'Total number of HTTP requests.',
-    ['method', 'endpoint', 'status_code']
-)
+# Import the custom registry from system_metrics
+from app.metrics.system_metrics import APP_REGISTRY
+
+# Counts for total HTTP requests keyed by (method, endpoint, status_code).
+# The middleware bumps plain ints here (no prometheus_client lock on the hot path)
+# and HttpRequestsCollector exposes them as http_requests_total on scrape.
+http_request_counts = {}
+
+class HttpRequestsCollector:
+    """
+    Custom collector exposing http_request_counts as the http_requests_total counter.
+    """
+    def collect(self):
+        family = CounterMetricFamily(
+            'http_requests_total',
+            'Total number of HTTP requests.',
+            labels=['method', 'endpoint', 'status_code']
+        )
+        for (method, endpoint, status_code), count in list(http_request_counts.items()):
+            family.add_metric([method, endpoint, str(status_code)], count)
+        yield family
 
-# Histogram for request durations
+APP_REGISTRY.register(HttpRequestsCollector())
+
+# Histogram for request durations (ballpark buckets are enough for latency dashboards)
 http_request_duration_seconds = Histogram(
     'http_request_duration_seconds',
     'Histogram of HTTP request durations in seconds.',
     ['method', 'endpoint'],
-    buckets=(0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0, float('inf'))
-)
-
-# Optional: Histograms for request and response sizes
-http_request_size_bytes = Histogram(
-    'http_request_size_bytes',
-    'Histogram of HTTP request sizes in bytes.',
-    ['method', 'endpoint'],
-    buckets=(100, 500, 1000, 5000, 10000, 50000, 100000, float('inf'))
+    buckets=(0.005, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0, float('inf')),
+    registry=APP_REGISTRY
 )
 
+# Histogram for response sizes (coarse buckets; status_code is already on http_requests_total)
 http_response_size_bytes = Histogram(
     'http_response_size_bytes',
     'Histogram of HTTP response sizes in bytes.',
-    ['method', 'endpoint', 'status_code'],
-    buckets=(100, 500, 1000, 5000, 10000, 50000, 100000, float('inf'))
-)
\ No newline at end of file
+    ['method', 'endpoint'],
+    buckets=(1000, 10000, float('inf')),
+    registry=APP_REGISTRY
+)
@@ -1,121 +1,121 @@
 import psutil
 import time
 import gc
-from prometheus_client import Gauge, Counter, CollectorRegistry, generate_latest
+from prometheus_client import Counter, CollectorRegistry
+from prometheus_client.core import GaugeMetricFamily
 
 # Create a custom CollectorRegistry for your application's metrics.
 # This isolates your metrics from the default global registry and prevents
 # "Duplicated timeseries" errors, especially in environments with reloaders.
 APP_REGISTRY = CollectorRegistry()
 
-# System-wide CPU Utilization
-# Registered with APP_REGISTRY
-system_cpu_utilization_gauge = Gauge(
-    'system_cpu_utilization_percent',
-    'System CPU utilization percentage',
-    registry=APP_REGISTRY
-)
+# There is only ever one process to observe, so its psutil handle and start
+# time (which never changes) are looked up once at import.
+_PROC = psutil.Process()
+_START_TIME = _PROC.create_time()
 
-# Process CPU Metrics
-# Registered with APP_REGISTRY
-process_cpu_seconds_total = Gauge(
-    'process_cpu_seconds_total',
-    'Total CPU time spent by the process in seconds.',
-    registry=APP_REGISTRY
-)
+# Prime the non-blocking CPU sampler: cpu_percent(interval=None) reports usage
+# since the previous call, and the very first call always returns 0.0.
+psutil.cpu_percent(interval=None)
 
-# Process Memory Metrics
-# Registered with APP_REGISTRY
-process_resident_memory_bytes = Gauge(
-    'process_resident_memory_bytes',
-    'Physical memory currently used by the process in bytes.',
-    registry=APP_REGISTRY
-)
-process_virtual_memory_bytes = Gauge(
-    'process_virtual_memory_bytes',
-    'Virtual memory allocated by the process in bytes.',
-    registry=APP_REGISTRY
-)
-
-# Process Thread Count
-# Registered with APP_REGISTRY
-process_threads = Gauge(
-    'process_threads',
-    'Total number of threads in the process.',
-    registry=APP_REGISTRY
-)
 
-# Process Start Time and Uptime
-# Registered with APP_REGISTRY
-process_start_time_seconds = Gauge(
-    'process_start_time_seconds',
-    'Process start time as a Unix timestamp.',
-    registry=APP_REGISTRY
-)
-process_uptime_seconds = Gauge(
-    'process_uptime_seconds',
-    'Process uptime in seconds.',
-    registry=APP_REGISTRY
-)
-
-# Process File Descriptor Usage
-# Registered with APP_REGISTRY
-process_open_fds = Gauge(
-    'process_open_fds',
-    'Number of open file descriptors by the process.',
-    registry=APP_REGISTRY
-)
+class SystemCollector:
+    """
+    Custom collector reporting system and process metrics.
+    Values are read with psutil when APP_REGISTRY is collected (i.e. on scrape),
+    so nothing runs between scrapes.
+    """
+    def collect(self):
+        # System-wide CPU Utilization (usage since the previous scrape)
+        yield GaugeMetricFamily(
+            'system_cpu_utilization_percent',
+            'System CPU utilization percentage',
+            value=psutil.cpu_percent(interval=None)
+        )
+
+        # oneshot() reads /proc/self/stat and friends once and serves the
+        # cpu_times/memory_info/num_threads lookups below from that cache.
+        with _PROC.oneshot():
+            cpu_times = _PROC.cpu_times()
+            memory_info = _PROC.memory_info()
+            num_threads = _PROC.num_threads()
+
+        # Process CPU Metrics
+        yield GaugeMetricFamily(
+            'process_cpu_seconds_total',
+            'Total CPU time spent by the process in seconds.',
+            value=cpu_times.user + cpu_times.system
+        )
+
+        # Process Memory Metrics
+        yield GaugeMetricFamily(
+            'process_resident_memory_bytes',
+            'Physical memory currently used by the process in bytes.',
+            value=memory_info.rss
+        )
+        yield GaugeMetricFamily(
+            'process_virtual_memory_bytes',
+            'Virtual memory allocated by the process in bytes.',
+            value=memory_info.vms
+        )
+
+        # Process Thread Count
+        yield GaugeMetricFamily(
+            'process_threads',
+            'Total number of threads in the process.',
+            value=num_threads
+        )
+
+        # Process Start Time and Uptime
+        yield GaugeMetricFamily(
+            'process_start_time_seconds',
+            'Process start time as a Unix timestamp.',
+            value=_START_TIME
+        )
+        yield GaugeMetricFamily(
+            'process_uptime_seconds',
+            'Process uptime in seconds.',
+            value=time.time() - _START_TIME
+        )
+
+        # Process File Descriptor Usage
+        try:
+            open_fds = _PROC.num_fds()
+        except psutil.AccessDenied:
+            # This can happen on some systems or with limited permissions.
+            # Skip the metric for this scrape rather than failing the collection.
+            open_fds = None
+        except Exception as e:
+            # Catch other potential errors during num_fds() call
+            print(f"Error getting file descriptors: {e}")
+            open_fds = None
+        if open_fds is not None:
+            yield GaugeMetricFamily(
+                'process_open_fds',
+                'Number of open file descriptors by the process.',
+                value=open_fds
+            )
+
+APP_REGISTRY.register(SystemCollector())
 
 # Garbage Collection Statistics (Python-specific)
 # Registered with APP_REGISTRY
-python_gc_collections_total = Gauge(
+python_gc_collections_total = Counter(
     'python_gc_collections_total',
-    'Total number of garbage collections across all generations.',
+    'Total number of garbage collections, by generation.',
+    ['generation'],
     registry=APP_REGISTRY
 )
 
+# One pre-bound child per GC generation, so the callback skips .labels()
+_GC_COLLECTIONS_BY_GENERATION = tuple(
+    python_gc_collections_total.labels(generation=str(generation))
+    for generation in range(len(gc.get_count()))
+)
 
-def update_system_metrics():
-    """
-    Updates the Prometheus gauges with current system and process metrics.
-    All metrics are explicitly collected using psutil or gc and registered
-    with the custom APP_REGISTRY.
-    """
-    proc = psutil.Process() # Get process object once for efficiency
-
-    # System-wide CPU utilization
-    system_cpu_utilization_gauge.set(psutil.cpu_percent(interval=None))
-
-    # Process CPU Metrics
-    cpu_times = proc.cpu_times()
-    total_cpu_time = cpu_times.user + cpu_times.system
-    process_cpu_seconds_total.set(total_cpu_time)
-
-    # Process Memory Metrics
-    memory_info = proc.memory_info()
-    process_resident_memory_bytes.set(memory_info.rss)
-    process_virtual_memory_bytes.set(memory_info.vms)
-
-    # Process Thread Count
-    process_threads.set(proc.num_threads())
-
-    # Process Start Time and Uptime
-    start_time = proc.create_time()
-    process_start_time_seconds.set(start_time)
-    process_uptime_seconds.set(time.time() - start_time)
-
-    # Process File Descriptor Usage
-    try:
-        process_open_fds.set(proc.num_fds())
-    except psutil.AccessDenied:
-        # This can happen on some systems or with limited permissions.
-        # Log this error if necessary, but avoid crashing the metric collection.
-        pass
-    except Exception as e:
-        # Catch other potential errors during num_fds() call
-        print(f"Error getting file descriptors: {e}")
-
-    # Garbage Collection Statistics
-    gc_counts_sum = sum(gc.get_count())
-    python_gc_collections_total.set(gc_counts_sum)
+def _count_gc_collection(phase, info):
+    # Invoked by the interpreter around every collection; count each completed pass
+    if phase == 'stop':
+        _GC_COLLECTIONS_BY_GENERATION[info['generation']].inc()
 
+gc.callbacks.append(_count_gc_collection)
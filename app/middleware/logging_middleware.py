@@ -0,0 +1,57 @@
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Request logger and the "app" logger hierarchy (logging.getLogger(__name__) in app modules):
+# records are only put on an in-memory queue here and written to stdout by the listener
+# thread, so the event loop never blocks on the write.
+log_queue = queue.Queue(-1)
+for _name in ("requests", "app"):
+    _queued_logger = logging.getLogger(_name)
+    _queued_logger.setLevel(logging.INFO)
+    _queued_logger.addHandler(QueueHandler(log_queue))
+    _queued_logger.propagate = False
+logger = logging.getLogger("requests")
+
+_stdout_handler = logging.StreamHandler(sys.stdout)
+_stdout_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+# Started/stopped by the application startup and shutdown events
+log_listener = QueueListener(log_queue, _stdout_handler)
+
+class LoggingMiddleware:
+    """
+    Pure ASGI middleware logging each request line and its response status.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        def log_request(status):
+            path = scope["path"]
+            if scope["query_string"]:
+                path = f"{path}?{scope['query_string'].decode('latin-1')}"
+            logger.info("%s %s -> %s", scope["method"], path, status)
+
+        async def send_wrapper(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                log_request(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Unhandled exceptions are turned into a 500 by ServerErrorMiddleware outside
+            # this middleware, so log those requests here
+            if not response_started:
+                log_request(500)
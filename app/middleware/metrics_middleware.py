@@ -1,49 +1,85 @@
 import time
-from starlette.requests import Request
-from starlette.responses import Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from app.metrics.http_metrics import http_requests_total, http_request_duration_seconds, http_request_size_bytes, http_response_size_bytes
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.metrics.http_metrics import http_request_counts, http_request_duration_seconds, http_response_size_bytes
 
-class MetricsMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        method = request.method
-        path = request.url.path
+# Endpoint label used for requests that did not match any route (e.g. 404s)
+UNMATCHED_ENDPOINT = "__unmatched__"
+
+# Label-bound metric children per (method, endpoint), so the hot path skips .labels().
+# Each entry is (duration child, response size child).
+_bound_metrics = {}
+
+def _get_bound_metrics(method: str, endpoint: str):
+    bound = _bound_metrics.get((method, endpoint))
+    if bound is None:
+        bound = _bound_metrics.setdefault((method, endpoint), (
+            http_request_duration_seconds.labels(method=method, endpoint=endpoint),
+            http_response_size_bytes.labels(method=method, endpoint=endpoint),
+        ))
+    return bound
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording HTTP request metrics and adding the X-API-Time response header.
+    Avoids BaseHTTPMiddleware, which runs every request inside an extra task group
+    and builds Request/Response wrappers around it.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        # Only HTTP requests are measured (lifespan/websocket pass straight through)
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        path = scope["path"]
 
         # Exclude metrics endpoint from being tracked by itself to avoid recursion
         if path == "/metrics":
-            return await call_next(request)
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
 
-        start_time = time.time()
+        status_code = 500
+        response_body_size = 0
 
-        # Try to get request body size (approximate for streaming)
-        request_body_size = 0
-        if request.headers.get("content-length"):
-            try:
-                request_body_size = int(request.headers["content-length"])
-            except ValueError:
-                pass # Ignore if not a valid integer
+        async def send_wrapper(message: Message):
+            nonlocal status_code, response_body_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Cheap always-on server timing, up to the point the response starts
+                api_time = f"{time.perf_counter() - start_time:.6f}".encode("latin-1")
+                message["headers"] = [*message.get("headers", ()), (b"x-api-time", api_time)]
+                # Response size from Content-Length (approximate, streaming bodies report 0)
+                for key, value in message.get("headers", ()):
+                    if key == b"content-length":
+                        # isdigit() rejects malformed values without raising
+                        if value.isdigit():
+                            response_body_size = int(value)
+                        break
+            await send(message)
 
-        response = await call_next(request)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            process_time = time.perf_counter() - start_time
 
-        process_time = time.time() - start_time
-        status_code = response.status_code
+            # Label by the matched route template (e.g. /data/{item_id}) rather than the raw
+            # path, so the number of endpoint series is bounded by the declared routes.
+            route = scope.get("route")
+            endpoint = route.path if route is not None else UNMATCHED_ENDPOINT
 
-        # Update HTTP request total counter
-        http_requests_total.labels(method=method, endpoint=path, status_code=status_code).inc()
+            duration, response_size = _get_bound_metrics(method, endpoint)
 
-        # Update HTTP request duration histogram
-        http_request_duration_seconds.labels(method=method, endpoint=path).observe(process_time)
+            # Update HTTP request total count (exposed as http_requests_total on scrape)
+            key = (method, endpoint, status_code)
+            http_request_counts[key] = http_request_counts.get(key, 0) + 1
 
-        # Update request size histogram
-        http_request_size_bytes.labels(method=method, endpoint=path).observe(request_body_size)
+            # Update HTTP request duration histogram
+            duration.observe(process_time)
 
-        # Update response size histogram (approximate, more accurate would require reading the body)
-        response_body_size = 0
-        if response.headers.get("content-length"):
-            try:
-                response_body_size = int(response.headers["content-length"])
-            except ValueError:
-                pass
-        http_response_size_bytes.labels(method=method, endpoint=path, status_code=status_code).observe(response_body_size)
-
-        return response
\ No newline at end of file
+            # Update response size histogram
+            response_size.observe(response_body_size)
@@ -0,0 +1,40 @@
+from urllib.parse import parse_qs
+from pyinstrument import Profiler
+from starlette.responses import HTMLResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+def _profiling_requested(query_string: bytes) -> bool:
+    if b"profile" not in query_string: # Fast path for the common case
+        return False
+    value = parse_qs(query_string.decode("latin-1")).get("profile", [""])[0]
+    return value.lower() not in ("", "0", "false")
+
+class ProfilerMiddleware:
+    """
+    Pure ASGI middleware profiling a single request on demand with pyinstrument.
+    Requests with ?profile=1 get the profiler's HTML report instead of their normal response;
+    every other request passes straight through.
+    Only registered when settings.PROFILING is enabled.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not _profiling_requested(scope["query_string"]):
+            await self.app(scope, receive, send)
+            return
+
+        # Profiler objects are not thread-safe; always use a fresh one per request
+        profiler = Profiler(interval=0.001, async_mode="enabled")
+
+        async def discard_response(message: Message):
+            pass
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard_response)
+        finally:
+            profiler.stop()
+
+        response = HTMLResponse(profiler.output_html())
+        await response(scope, receive, send)
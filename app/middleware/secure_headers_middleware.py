@@ -0,0 +1,41 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Security headers (like Helmet), same defaults as secure.SecureHeaders().
+# Encoded once here so responses only get a list extension.
+SECURE_HEADERS = [
+    (b"strict-transport-security", b"max-age=63072000; includeSubdomains"),
+    (b"x-frame-options", b"SAMEORIGIN"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"x-content-type-options", b"nosniff"),
+    (b"referrer-policy", b"no-referrer, strict-origin-when-cross-origin"),
+    (b"cache-control", b"no-cache, no-store, must-revalidate, max-age=0"),
+    (b"pragma", b"no-cache"),
+    (b"expires", b"0"),
+]
+_SECURE_HEADER_NAMES = frozenset(name for name, _ in SECURE_HEADERS)
+
+class SecureHeadersMiddleware:
+    """
+    Pure ASGI middleware adding SECURE_HEADERS to every HTTP response.
+    Headers already set by the route with the same name are replaced (ASGI
+    header names are lowercase bytes, so they are compared as-is).
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                headers = [
+                    (name, value) for name, value in message.get("headers", ())
+                    if name not in _SECURE_HEADER_NAMES
+                ]
+                headers.extend(SECURE_HEADERS)
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,156 +1,266 @@
+import asyncio
+import time
+from collections import OrderedDict
 import asyncpg
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from prometheus_client import Counter, Gauge
-from typing import Optional # Import Optional for type hinting
-
-# Import the custom registry from system_metrics
-from app.metrics.system_metrics import APP_REGISTRY
-
-# Ensure all metrics use the APP_REGISTRY
-items_created_counter = Counter(
-    'items_created_total',
-    'Total number of items created.',
-    registry=APP_REGISTRY # Register with the custom registry
-)
-items_in_db_gauge = Gauge(
-    'items_in_database',
-    'Current number of items stored in the database.',
-    registry=APP_REGISTRY # Register with the custom registry
-)
-
-# Counter for total HTTP requests with labels for method
-http_requests_total = Counter(
-    'http_requests_total',
-    'Total HTTP requests by method.',
-    labelnames=['method'], # Define labels for the counter
-    registry=APP_REGISTRY # Register with the custom registry
-)
-
-router = APIRouter()
+import orjson
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Annotated, Optional # Import Optional for type hinting
+
+from app.dependencies import get_pool
+from app.metrics.app_metrics import items_created_counter, items_in_db_gauge
+
+# orjson (C extension) serializes every JSON response from this router
+router = APIRouter(default_response_class=ORJSONResponse)
+
+# Item names must fit the VARCHAR(255) column and contain no NUL byte (rejected by Postgres text),
+# so a bad name is refused with 422 before it can fail a batched insert
+ItemName = Annotated[str, Field(max_length=255, pattern=r"^[^\x00]*$")]
 
 class Item(BaseModel):
+    # Reject unknown fields with 422 instead of silently dropping them
+    model_config = ConfigDict(extra='forbid')
+
     id: Optional[int] = None  # Use Optional[int] for Python versions < 3.10
-    name: str
+    name: ItemName
 
 # Pydantic model for updating an item (only name is expected in the body for update)
 class ItemUpdate(BaseModel):
-    name: str
+    # Same as Item: unknown fields are rejected with 422 (PUT /data/{item_id} and POST /data/bulk)
+    model_config = ConfigDict(extra='forbid')
+
+    name: ItemName
+
+# Queue of (name, future) pairs waiting to be inserted by batch_insert_writer (created in main.py)
+insert_queue = None
+
+# Serialized GET /data pages keyed by (limit, offset) as (monotonic timestamp, body),
+# least recently used first. Emptied on any write in this process; _items_cache_version is
+# bumped on every write so a read that raced a write never stores stale rows.
+# Writes handled by other workers are not seen, so pages also expire after ITEMS_CACHE_TTL.
+_items_cache = OrderedDict()
+_items_cache_version = 0
+ITEMS_CACHE_MAX_PAGES = 128
+ITEMS_CACHE_TTL = 2.0 # seconds
+# Page fetches in progress, keyed like _items_cache: concurrent misses for the same page
+# await the one fetch, while misses for different pages query the database in parallel
+_items_inflight = {}
+
+def invalidate_items_cache():
+    global _items_cache_version
+    _items_cache.clear()
+    # Fetches started before this write may return old rows; later reads must not join them
+    _items_inflight.clear()
+    _items_cache_version += 1
+
+def _get_cached_page(key):
+    entry = _items_cache.get(key)
+    if entry is None:
+        return None
+    cached_at, body = entry
+    if time.monotonic() - cached_at > ITEMS_CACHE_TTL:
+        del _items_cache[key]
+        return None
+    _items_cache.move_to_end(key)
+    return body
+
+# Concurrent POSTs arriving within this window are written with a single INSERT
+INSERT_BATCH_WINDOW = 0.005 # seconds
+INSERT_BATCH_MAX = 500
 
-# Database connection pool (will be passed from main.py)
-db_pool = None
+# SQL for the CRUD endpoints. Keeping the text constant lets asyncpg's per-connection
+# statement cache (configured on the pool in main.py) reuse the prepared statements.
+# Rows are inserted in ord order, so their serial ids ascend in batch order
+SQL_INSERT_BATCH = """
+    INSERT INTO items (name)
+    SELECT name FROM unnest($1::text[]) WITH ORDINALITY AS t(name, ord)
+    ORDER BY ord
+    RETURNING id
+"""
+SQL_INSERT = "INSERT INTO items (name) VALUES ($1) RETURNING id"
+SQL_SELECT_PAGE = "SELECT id, name FROM items ORDER BY id LIMIT $1 OFFSET $2"
+SQL_UPDATE = "UPDATE items SET name = $1 WHERE id = $2 RETURNING id"
+SQL_DELETE = "DELETE FROM items WHERE id = $1 RETURNING 1"
+
+async def batch_insert_writer(pool: asyncpg.Pool):
+    """
+    Background task draining insert_queue.
+    Collects the POSTs that arrive within INSERT_BATCH_WINDOW (up to INSERT_BATCH_MAX),
+    inserts them with one round-trip and resolves each waiting future with its new ID.
+    If the batch is rejected because of a row's data, the rows are retried one at a time so only
+    the failing requests receive the error; any other failure (connection, timeout) fails the whole batch.
+    """
+    while True:
+        batch = [await insert_queue.get()]
+        await asyncio.sleep(INSERT_BATCH_WINDOW)
+        while not insert_queue.empty() and len(batch) < INSERT_BATCH_MAX:
+            batch.append(insert_queue.get_nowait())
+
+        try:
+            rows = await pool.fetch(SQL_INSERT_BATCH, [name for name, _ in batch])
+        except (asyncpg.DataError, asyncpg.IntegrityConstraintViolationError):
+            await _insert_one_by_one(pool, batch)
+            continue
+        except Exception as e:
+            # Retrying row by row against an unreachable database would wait out one timeout per row
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            continue
+
+        invalidate_items_cache()
+        # One increment per batch rather than per item
+        items_created_counter.inc(len(rows))
+        items_in_db_gauge.inc(len(rows))
+        new_ids = sorted(row[0] for row in rows) # Positional access: column 0 is id
+        for (_, future), new_id in zip(batch, new_ids):
+            if not future.done():
+                future.set_result(new_id)
+
+async def _insert_one_by_one(pool: asyncpg.Pool, batch):
+    # Fallback for a failed batch: insert each row on its own so one bad row fails only its request
+    for name, future in batch:
+        try:
+            new_id = await pool.fetchval(SQL_INSERT, name)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            continue
+        # Invalidate before resolving, so the caller never reads a page cached without its row
+        invalidate_items_cache()
+        items_created_counter.inc()
+        items_in_db_gauge.inc()
+        if not future.done():
+            future.set_result(new_id)
 
 @router.post("/data", response_model=Item)
 async def create_item(item: Item):
     """
     Endpoint to create a new item in the database.
-    Acquires a connection from the pool, inserts data, and releases the connection.
-    Increments the items_created_total counter and items_in_database gauge.
-    Also increments http_requests_total for POST requests.
+    Queues the insert for batch_insert_writer, which batches concurrent inserts into one query
+    and increments the items_created_total counter and items_in_database gauge per batch.
     --- MODIFIED: Returns the created item including its database-generated ID. ---
     """
-    # Increment the HTTP requests counter for POST method
-    http_requests_total.labels(method='POST').inc()
+    # Hand the insert to batch_insert_writer and wait for the database-generated ID
+    future = asyncio.get_running_loop().create_future()
+    insert_queue.put_nowait((item.name, future))
+    new_item_id = await future
 
-    if not db_pool:
-        raise HTTPException(status_code=500, detail="Database pool not initialized.")
+    # Return the item with its new ID (model_construct skips construction-time validation;
+    # FastAPI still validates the result against response_model=Item when serializing)
+    return Item.model_construct(id=new_item_id, name=item.name)
 
-    async with db_pool.acquire() as connection:
-        try:
-            # Use RETURNING id to get the auto-generated ID back
-            new_item_id = await connection.fetchval(
-                "INSERT INTO items (name) VALUES ($1) RETURNING id",
-                item.name
-            )
-            items_created_counter.inc()
-            items_in_db_gauge.inc()
-            # Return the item with its new ID
-            return Item(id=new_item_id, name=item.name)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error creating item: {e}")
+# Upper bound on items per POST /data/bulk. With at most 255 characters per name, the worst-case
+# body is every character a non-BMP one escaped as a surrogate pair (12 bytes, e.g. \ud83d\ude00):
+# 10000 * 255 * 12 bytes ~= 30.6 MB, within nginx's client_max_body_size 32m (nginx.conf).
+BULK_CREATE_MAX_ITEMS = 10000
+# COPY of a full bulk request can take longer than the pool's default command_timeout
+BULK_COPY_TIMEOUT = 60 # seconds
+
+@router.post("/data/bulk")
+async def bulk_create_items(
+    items: list[ItemUpdate] = Body(..., max_length=BULK_CREATE_MAX_ITEMS),
+    pool: asyncpg.Pool = Depends(get_pool)
+):
+    """
+    Endpoint to create many items at once.
+    Loads them with the COPY protocol in a single transaction instead of one INSERT per item.
+    Increments the items_created_total counter and items_in_database gauge.
+    """
+    if items:
+        async with pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.copy_records_to_table(
+                    'items',
+                    records=[(item.name,) for item in items],
+                    columns=('name',),
+                    timeout=BULK_COPY_TIMEOUT
+                )
+        invalidate_items_cache()
+        items_created_counter.inc(len(items))
+        items_in_db_gauge.inc(len(items))
+    return {"created": len(items)}
 
 @router.get("/data", response_model=list[Item])
-async def read_items():
+async def read_items(
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    pool: asyncpg.Pool = Depends(get_pool)
+):
     """
-    Endpoint to retrieve all items from the database.
-    Acquires a connection from the pool, fetches data, and releases the connection.
-    Updates the items_in_database gauge with the current count.
-    Also increments http_requests_total for GET requests.
+    Endpoint to retrieve a page of items from the database, ordered by ID.
+    Serves the cached JSON body when no write happened since the page was last read; otherwise
+    acquires a connection from the pool, fetches the page, and caches the serialized result.
     --- MODIFIED: Retrieves and returns the ID along with the name. ---
     """
-    # Increment the HTTP requests counter for GET method
-    http_requests_total.labels(method='GET').inc()
+    key = (limit, offset)
+    body = _get_cached_page(key)
+    if body is not None:
+        return Response(content=body, media_type="application/json")
 
-    if not db_pool:
-        raise HTTPException(status_code=500, detail="Database pool not initialized.")
+    inflight = _items_inflight.get(key)
+    if inflight is not None:
+        # shield() so a cancelled waiter does not cancel the fetch other requests share
+        body = await asyncio.shield(inflight)
+        return Response(content=body, media_type="application/json")
 
-    async with db_pool.acquire() as connection:
-        try:
-            # Select both id and name
-            rows = await connection.fetch("SELECT id, name FROM items")
-            items_in_db_gauge.set(len(rows))
-            # Create Item objects including the id
-            return [Item(id=row['id'], name=row['name']) for row in rows]
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error reading items: {e}")
+    inflight = asyncio.get_running_loop().create_future()
+    _items_inflight[key] = inflight
+    try:
+        version = _items_cache_version
+        # Select both id and name
+        rows = await pool.fetch(SQL_SELECT_PAGE, limit, offset)
+
+        # Serialize the rows directly with orjson; building Item models only to
+        # re-encode them dominates CPU on large tables (response_model is kept for the docs).
+        # Rows are (id, name) per SQL_SELECT_PAGE; positional access skips the column name lookup.
+        body = orjson.dumps([{"id": row[0], "name": row[1]} for row in rows])
+        if version == _items_cache_version:
+            _items_cache[key] = (time.monotonic(), body)
+            if len(_items_cache) > ITEMS_CACHE_MAX_PAGES:
+                _items_cache.popitem(last=False)
+        inflight.set_result(body)
+    except asyncio.CancelledError:
+        inflight.cancel()
+        raise
+    except Exception as e:
+        # Waiters get the same error; mark it retrieved in case there are none
+        inflight.set_exception(e)
+        inflight.exception()
+        raise
+    finally:
+        # A write may have dropped this fetch and a newer one may own the key by now
+        if _items_inflight.get(key) is inflight:
+            del _items_inflight[key]
+    return Response(content=body, media_type="application/json")
 
 @router.put("/data/{item_id}", response_model=Item)
-async def update_item(item_id: int, item: ItemUpdate):
+async def update_item(item_id: int, item: ItemUpdate, pool: asyncpg.Pool = Depends(get_pool)):
     """
     Endpoint to update an existing item in the database.
-    Acquires a connection from the pool, updates data, and releases the connection.
-    Increments the http_requests_total for PUT requests.
+    Runs the update directly on the pool, which acquires and releases a connection.
     """
-    # Increment the HTTP requests counter for PUT method
-    http_requests_total.labels(method='PUT').inc()
-
-    if not db_pool:
-        raise HTTPException(status_code=500, detail="Database pool not initialized.")
-
-    async with db_pool.acquire() as connection:
-        try:
-            # The UPDATE statement correctly uses id
-            result = await connection.execute(
-                "UPDATE items SET name = $1 WHERE id = $2",
-                item.name,
-                item_id
-            )
-            if result == "UPDATE 0":
-                raise HTTPException(status_code=404, detail=f"Item with ID {item_id} not found.")
-            # Return the updated item with its ID
-            return Item(id=item_id, name=item.name)
-        except HTTPException as e:
-            raise e # Re-raise HTTPExceptions
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error updating item: {e}")
+    # The UPDATE statement correctly uses id
+    updated_id = await pool.fetchval(SQL_UPDATE, item.name, item_id)
+    if updated_id is None:
+        raise HTTPException(status_code=404, detail=f"Item with ID {item_id} not found.")
+    invalidate_items_cache()
+    # Return the updated item with its ID (model_construct skips construction-time validation;
+    # FastAPI still validates the result against response_model=Item when serializing)
+    return Item.model_construct(id=item_id, name=item.name)
 
 @router.delete("/data/{item_id}", status_code=204)
-async def delete_item(item_id: int):
+async def delete_item(item_id: int, pool: asyncpg.Pool = Depends(get_pool)):
     """
     Endpoint to delete an item from the database.
-    Acquires a connection from the pool, deletes data, and releases the connection.
+    Runs the delete directly on the pool, which acquires and releases a connection.
     Decrements the items_in_database gauge.
-    Increments the http_requests_total for DELETE requests.
     """
-    # Increment the HTTP requests counter for DELETE method
-    http_requests_total.labels(method='DELETE').inc()
-
-    if not db_pool:
-        raise HTTPException(status_code=500, detail="Database pool not initialized.")
-
-    async with db_pool.acquire() as connection:
-        try:
-            # The DELETE statement correctly uses id
-            result = await connection.execute(
-                "DELETE FROM items WHERE id = $1",
-                item_id
-            )
-            if result == "DELETE 0":
-                raise HTTPException(status_code=404, detail=f"Item with ID {item_id} not found.")
-            items_in_db_gauge.dec() # Decrement the gauge on successful deletion
-            return {"message": "Item deleted successfully"}
-        except HTTPException as e:
-            raise e # Re-raise HTTPExceptions
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error deleting item: {e}")
-
+    # The DELETE statement correctly uses id
+    deleted = await pool.fetchval(SQL_DELETE, item_id)
+    if deleted is None:
+        raise HTTPException(status_code=404, detail=f"Item with ID {item_id} not found.")
+    invalidate_items_cache()
+    items_in_db_gauge.dec() # Decrement the gauge on successful deletion
+    return {"message": "Item deleted successfully"}
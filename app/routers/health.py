@@ -1,22 +1,45 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import ORJSONResponse
+import asyncio
+import logging
 import asyncpg
+from typing import Optional
 
-router = APIRouter()
+# orjson (C extension) serializes every JSON response from this router
+router = APIRouter(default_response_class=ORJSONResponse)
 
-# Database connection pool (will be passed from main.py)
-db_pool = None
+logger = logging.getLogger(__name__)
+
+# Result of the last database probe, refreshed by db_health_probe_task (started in main.py)
+HEALTH_PROBE_INTERVAL = 2 # seconds
+_db_ok: Optional[bool] = None # None until the first probe completes
+
+# Static detail for a failed probe; the underlying error is logged by the probe task
+DB_UNAVAILABLE_DETAIL = "Service Unavailable: Database connection failed."
+
+async def db_health_probe_task(pool: asyncpg.Pool):
+    """
+    Background task checking database connectivity every HEALTH_PROBE_INTERVAL seconds,
+    so frequent /health probes never reach the database themselves.
+    """
+    global _db_ok
+    while True:
+        try:
+            await pool.execute("SELECT 1")
+            _db_ok = True
+        except Exception:
+            if _db_ok is not False:
+                # Log once when the database becomes (or starts out) unreachable, not on every probe
+                logger.exception("Database health probe failed")
+            _db_ok = False
+        await asyncio.sleep(HEALTH_PROBE_INTERVAL)
 
 @router.get("/health")
 async def health_check():
     """
     Health check endpoint.
-    Checks database connectivity.
+    Reports database connectivity from the last background probe.
     """
-    if not db_pool:
-        raise HTTPException(status_code=503, detail="Service Unavailable: Database pool not initialized.")
-    try:
-        async with db_pool.acquire() as connection:
-            await connection.execute("SELECT 1")
-        return {"status": "ok", "database": "connected"}
-    except Exception as e:
-        raise HTTPException(status_code=503, detail=f"Service Unavailable: Database connection failed - {e}")
\ No newline at end of file
+    if not _db_ok:
+        raise HTTPException(status_code=503, detail=DB_UNAVAILABLE_DETAIL)
+    return {"status": "ok", "database": "connected"}